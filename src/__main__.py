@@ -1,14 +1,13 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from datetime import datetime
 import subprocess
 import sys
 import os
-import re
-from typing import Callable
-from collections import defaultdict
-import frontmatter
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ThreadPoolExecutor
+import yaml
 from textwrap import dedent
 import argparse
 from enum import Enum
@@ -22,41 +21,42 @@ class PathStrategy(Enum):
     CONFLICT_FREE = "conflict-free"
 
     def get_change_path_set(self, change: ChangeDescription) -> ChangePathSet:
-        simple_conversion_map = {
-            self.TAGS_AND_FILENAME: PathStrategy.tags_and_filename_paths,
-            self.TAGS_ONLY: PathStrategy.tags_only_paths,
-            self.FILEPATH_ONLY: PathStrategy.filepath_only_paths
-        }
-        simple_convert_fn = simple_conversion_map.get(self, None)
+        simple_convert_fn = PathStrategy._SIMPLE_CONVERT_FN.get(self, None)
 
         if simple_convert_fn is not None:
-            old_paths = simple_convert_fn([(file_change.old_path, file_change.old_tags) for file_change in change.file_changes])
-            new_paths = simple_convert_fn([(file_change.new_path, file_change.new_tags) for file_change in change.file_changes])
-            return ChangePathSet(old_paths, new_paths)
+            old_pairs, new_pairs = PathStrategy.old_and_new_pairs(change)
+            return ChangePathSet(simple_convert_fn(old_pairs), simple_convert_fn(new_pairs))
 
-        complex_conversion_map = {
-            self.CONFLICT_FREE: self.conflict_free_paths
-        }
-        complex_convert_fn = complex_conversion_map[self]
-        return complex_convert_fn(change)
-        
+        complex_convert_fn = PathStrategy._COMPLEX_CONVERT_FN[self]
+        return complex_convert_fn(self, change)
 
     @staticmethod
-    def tags_and_filename_paths(pairs: list[tuple[str | None, list[str] | None]]) -> set[str]:
+    def old_and_new_pairs(change: ChangeDescription) -> tuple[
+        list[tuple[str | None, str | None, list[str] | None]], list[tuple[str | None, str | None, list[str] | None]]
+    ]:
+        old_pairs = []
+        new_pairs = []
+        for file_change in change.file_changes:
+            old_pairs.append((file_change.old_path, file_change.old_basename, file_change.old_tags))
+            new_pairs.append((file_change.new_path, file_change.new_basename, file_change.new_tags))
+        return old_pairs, new_pairs
+
+    @staticmethod
+    def tags_and_filename_paths(pairs: list[tuple[str | None, str | None, list[str] | None]]) -> set[str]:
         paths = set()
-        for path, tags in pairs:
+        for path, basename, tags in pairs:
             if tags is not None and len(tags) > 0:
                 paths.update({
-                    f"{tag}/{path.split('/')[-1]}" for tag in tags
+                    f"{tag}/{basename}" for tag in tags
                 })
             elif path is not None:
                 paths.add(path)
         return paths
 
     @staticmethod
-    def tags_only_paths(pairs: list[tuple[str | None, list[str] | None]]) -> set[str]:
+    def tags_only_paths(pairs: list[tuple[str | None, str | None, list[str] | None]]) -> set[str]:
         paths = set()
-        for path, tags in pairs:
+        for path, _, tags in pairs:
             if tags is not None and len(tags) > 0:
                 paths.update({
                     f"{tag}.md" for tag in tags
@@ -66,9 +66,9 @@ class PathStrategy(Enum):
         return paths
 
     @staticmethod
-    def filepath_only_paths(pairs: list[tuple[str | None, list[str] | None]]) -> set[str]:
+    def filepath_only_paths(pairs: list[tuple[str | None, str | None, list[str] | None]]) -> set[str]:
         paths = set()
-        for path, tags in pairs:
+        for path, _, tags in pairs:
             if path is not None:
                 paths.add(path)
         return paths
@@ -78,91 +78,105 @@ class PathStrategy(Enum):
             setattr(self, "current_alternatives_map", dict())
         current_alternatives = getattr(self, "current_alternatives_map")
 
-        old_paths = set()
-        new_paths = set()
-
-        # perform alternatives calculations
-        def get_path_alternatives(pairs: list[tuple[str | None, list[str] | None]]) -> dict[str, set[str]]:
-            alternatives = dict()
-            for path, tags in pairs:
-                if tags is not None and len(tags) > 0 and path is not None:
-                    for tag in tags:
-                        tag_path = f'{tag}.md'
-                        tag_path_alternative = f'{tag}/{path.split("/")[-1]}'
-                        if tag_path in alternatives:
-                            alternatives[tag_path].add(tag_path_alternative)
-                        else:
-                            alternatives[tag_path] = {tag_path_alternative}
-                elif path is not None:
-                    alternatives[path] = set()
-            return alternatives
-
-        old_alternatives = get_path_alternatives([(file_change.old_path, file_change.old_tags) for file_change in change.file_changes])
-        new_alternatives = get_path_alternatives([(file_change.new_path, file_change.new_tags) for file_change in change.file_changes])
+        old_pairs, new_pairs = PathStrategy.old_and_new_pairs(change)
+        old_paths, new_paths = select_conflict_free_paths(
+            current_alternatives,
+            get_path_alternatives(old_pairs),
+            get_path_alternatives(new_pairs)
+        )
+        return ChangePathSet(old_paths, new_paths)
 
-        # perform path selection (use alternatives if name is ambiguous)
-        for path, alternatives in old_alternatives.items():
-            all_alternatives = set(alternatives)
-            if path in current_alternatives:
-                all_alternatives.update(current_alternatives[path])
-
-            if len(all_alternatives) > 1:
-                old_paths.update(all_alternatives)
-            else:
-                old_paths.add(path)
-        
-        for path, alternatives in new_alternatives.items():
-            all_alternatives = set(alternatives)
-            if path in current_alternatives:
-                all_alternatives.update(current_alternatives[path])
 
+# dispatch tables of PathStrategy, built once at import time (assigned after
+# the class body, otherwise Enum would turn them into members)
+PathStrategy._SIMPLE_CONVERT_FN = {
+    PathStrategy.TAGS_AND_FILENAME: PathStrategy.tags_and_filename_paths,
+    PathStrategy.TAGS_ONLY: PathStrategy.tags_only_paths,
+    PathStrategy.FILEPATH_ONLY: PathStrategy.filepath_only_paths
+}
+PathStrategy._COMPLEX_CONVERT_FN = {
+    PathStrategy.CONFLICT_FREE: PathStrategy.conflict_free_paths
+}
+
+
+def get_path_alternatives(pairs: list[tuple[str | None, str | None, list[str] | None]]) -> dict[str, set[str]]:
+    alternatives = dict()
+    for path, basename, tags in pairs:
+        if tags is not None and len(tags) > 0 and path is not None:
+            for tag in tags:
+                tag_path = f'{tag}.md'
+                tag_path_alternative = f'{tag}/{basename}'
+                if tag_path in alternatives:
+                    alternatives[tag_path].add(tag_path_alternative)
+                else:
+                    alternatives[tag_path] = {tag_path_alternative}
+        elif path is not None:
+            alternatives[path] = set()
+    return alternatives
+
+
+def select_conflict_free_paths(
+    current_alternatives: dict[str, set[str]],
+    old_alternatives: dict[str, set[str]],
+    new_alternatives: dict[str, set[str]]
+) -> tuple[set[str], set[str]]:
+    """Select old and new paths of a change (use alternatives if name is ambiguous)"""
+    # current_alternatives holds the state before the change and is updated in place
+    def select_paths(alternatives_by_path: dict[str, set[str]]) -> set[str]:
+        paths = set()
+        for path, alternatives in alternatives_by_path.items():
+            current = current_alternatives.get(path)
+            all_alternatives = alternatives if current is None else alternatives | current
             if len(all_alternatives) > 1:
-                new_paths.update(all_alternatives)
+                paths.update(all_alternatives)
             else:
-                new_paths.add(path)
-
-        # finish / maintenance
-        # remove or retain alternatives
-        updated_current_alternatives = dict()
-        for path, alternatives in current_alternatives.items():
-            if path in old_alternatives and path not in new_alternatives:
-                # delete path in next update
-                continue
-            elif path in new_alternatives and path not in old_alternatives:
-                # add path completely new in next update
-                updated_current_alternatives[path] = set(new_alternatives[path])
-            elif path in old_alternatives and path in new_alternatives:
-                # modified => alternatives may have changed
-                updated_current_alternatives[path] = set(alternatives)
-                updated_current_alternatives[path].difference_update(old_alternatives[path])
-                updated_current_alternatives[path].update(new_alternatives[path])
-            else:
-                # path and alternatives are unmodified
-                updated_current_alternatives[path] = set(alternatives)
-        # add new paths
-        for path, alternatives in new_alternatives.items():
-            if path not in updated_current_alternatives:
-                updated_current_alternatives[path] = set(alternatives)
-        setattr(self, "current_alternatives_map", updated_current_alternatives)
-
-        return ChangePathSet(old_paths, new_paths)
-
+                paths.add(path)
+        return paths
 
-@dataclass
+    old_paths = select_paths(old_alternatives)
+    new_paths = select_paths(new_alternatives)
+
+    # finish / maintenance
+    # only paths touched by the change need their alternatives updated
+    for path in old_alternatives:
+        if path not in new_alternatives:
+            # path was deleted
+            current_alternatives.pop(path, None)
+    for path, alternatives in new_alternatives.items():
+        current = current_alternatives.get(path)
+        if path in old_alternatives and current is not None:
+            # modified => alternatives may have changed
+            current.difference_update(old_alternatives[path])
+            current.update(alternatives)
+        else:
+            # path is completely new
+            current_alternatives[path] = set(alternatives)
+
+    return old_paths, new_paths
+
+
+@dataclass(slots=True)
 class ChangePathSet:
     old_paths: set[str] = field(default_factory=set)
     new_paths: set[str] = field(default_factory=set)
 
 
-@dataclass
+@dataclass(slots=True)
 class FileChange:
     old_path: str | None
     new_path: str | None
     old_tags: list[str] | None = None
     new_tags: list[str] | None = None
+    old_basename: str | None = field(init=False)
+    new_basename: str | None = field(init=False)
+
+    def __post_init__(self):
+        # computed once while parsing instead of per tag in the path strategies
+        self.old_basename = sys.intern(self.old_path.rpartition('/')[2]) if self.old_path is not None else None
+        self.new_basename = sys.intern(self.new_path.rpartition('/')[2]) if self.new_path is not None else None
 
 
-@dataclass
+@dataclass(slots=True)
 class ChangeDescription:
     change_id: str
     author: str
@@ -170,144 +184,313 @@ class ChangeDescription:
     file_changes: list[FileChange] = field(default_factory=list)
 
 
-def get_jj_commits_and_file_path_changes(revset: str, ignore_working_copy: bool) -> list[ChangeDescription]:
+def _is_decimal_at(text: str, *slices: tuple[int, int]) -> bool:
+    return all(text[start:end].isdecimal() for start, end in slices)
+
+
+def _parse_change_header(row: str) -> tuple[str, str, str, str] | None:
+    # matches 'change_id author YYYY-MM-DD HH:MM:SS ...' of builtin_log_oneline
+    # and returns (change_id, author, date, time)
+    parts = row.split(' ', 4)
+    if len(parts) < 4:
+        return None
+    change_id, author, date, time = parts[:4]
+    if not (change_id.isascii() and change_id.isalpha() and change_id.islower()):
+        return None
+    if not author.replace('_', 'a').isalnum():
+        return None
+    if len(date) != 10 or date[4] != '-' or date[7] != '-' or not _is_decimal_at(date, (0, 4), (5, 7), (8, 10)):
+        return None
+    if len(time) != 8 or time[2] != ':' or time[5] != ':' or not _is_decimal_at(time, (0, 2), (3, 5), (6, 8)):
+        return None
+    return change_id, author, date, time
+
+
+def _split_rename_path(path: str) -> tuple[str, str, str, str]:
+    # splits 'prefix{old => new}suffix' into its four parts
+    i = path.find('{')
+    j = path.find(' => ', i)
+    k = path.find('}', j)
+    return path[:i], path[i+1:j], path[j+4:k], path[k+1:]
+
+
+def _renamed_file_change(path: str) -> FileChange:
+    prefix, old_part, new_part, suffix = _split_rename_path(path)
+    return FileChange(old_path=prefix+old_part+suffix, new_path=prefix+new_part+suffix)
+
+
+def _copied_file_change(path: str) -> FileChange:
+    # a copy leaves the source untouched
+    prefix, old_part, new_part, suffix = _split_rename_path(path)
+    return FileChange(old_path=None, new_path=prefix+new_part+suffix)
+
+
+# handlers of `jj log --summary` rows, which are formatted as 'OP PATH'
+_OP_HANDLERS: dict[str, Callable[[str], FileChange]] = {
+    'M': lambda path: FileChange(old_path=path, new_path=path),
+    'A': lambda path: FileChange(old_path=None, new_path=path),
+    'D': lambda path: FileChange(old_path=path, new_path=None),
+    'R': _renamed_file_change,
+    'C': _copied_file_change,
+}
+
+
+def get_jj_commits_and_file_path_changes(revset: str, ignore_working_copy: bool) -> Iterator[ChangeDescription]:
+    # oldest first, so changes can be processed while they are parsed; this is
+    # jj's topological order, which is only chronological for linear histories
+    # (parallel branches can make timestamps in the gource log go backwards)
     cmd_submission = ["jj", "log", "-r", revset, "-T", "builtin_log_oneline",
-                      "--summary", "--no-graph"]
+                      "--summary", "--no-graph", "--reversed"]
     if ignore_working_copy:
         cmd_submission.append("--ignore-working-copy")
 
+    # block buffered: rows are still iterated one by one, but read in 1 MiB chunks
     cmdpipe = subprocess.Popen(
-        cmd_submission, stdout=subprocess.PIPE, text=True, bufsize=1)
-    # output = subprocess.check_output(cmd_submission).decode()
+        cmd_submission, stdout=subprocess.PIPE, text=True, bufsize=1 << 20)
 
-    changes = []
     current_change: ChangeDescription | None = None
 
-    # Regex for commit header
-    change_header_re = re.compile(
-        r'^([a-z]+)\s+(\w+)\s+(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})'
-    )
-    change_filepath_re = re.compile(
-        r'(.*)\{(.+) => (.+)\}(.*)'
-    )
-
     for row in cmdpipe.stdout:
-        row: str = row.strip()
-        if not row:
+        # rows keep their newline, it is only cut off where a row is used
+        if row == '\n':
             continue
 
-        match = change_header_re.match(row)
-        if match:
+        # summary rows start with an uppercase op, change ids are lowercase
+        op_handler = _OP_HANDLERS.get(row[0])
+        if op_handler is not None and row[1:2] == ' ':
             if current_change:
-                changes.append(current_change)
+                path_end = -1 if row[-1] == '\n' else len(row)
+                current_change.file_changes.append(op_handler(row[2:path_end]))
+            continue
+
+        header = _parse_change_header(row.rstrip('\n'))
+        if header:
+            if current_change:
+                yield current_change
 
-            change_id, author, timestamp = match.groups()
-            date, time = timestamp.split(" ")
+            change_id, author, date, time = header
             current_change = ChangeDescription(
                 change_id=change_id,
-                author=author,
+                # repeats across most changes
+                author=sys.intern(author),
                 timestamp=f"{date}T{time}Z"
             )
-        elif current_change:
-            op = row[0]
-            path = row[2:]
-
-            file_change: FileChange | None = None
-
-            if op == 'A':
-                file_change = FileChange(old_path=None, new_path=path)
-            elif op == 'M':
-                file_change = FileChange(old_path=path, new_path=path)
-            elif op == 'D':
-                file_change = FileChange(old_path=path, new_path=None)
-            elif op == 'C':
-                match = change_filepath_re.match(path)
-                prefix, old_part, new_part, suffix = match.groups()
-                file_change = FileChange(
-                    old_path=None, new_path=prefix+new_part+suffix)
-            elif op == 'R':
-                match = change_filepath_re.match(path)
-                prefix, old_part, new_part, suffix = match.groups()
-                file_change = FileChange(
-                    old_path=prefix+old_part+suffix,
-                    new_path=prefix+new_part+suffix
-                )
-
-            if file_change:
-                current_change.file_changes.append(file_change)
+
+    if current_change:
+        yield current_change
 
     cmdpipe.stdout.close()
-    return changes
 
 
-tags_at_revision_cache: dict[str, dict[str, list[str] | None]] = defaultdict(dict)
+# libyaml based loader if PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-def get_tags_at_jj_revision(filepath: str, change_id: str) -> list[str] | None:
-    if not filepath.endswith(".md"):
-        return None
 
-    if change_id in tags_at_revision_cache[filepath]:
-        return tags_at_revision_cache[filepath][change_id]
+# characters in a flow sequence that need a real YAML parser
+_YAML_FLOW_SPECIAL_CHARS = frozenset("'\"[]{}#&*!|>%@`:?\t")
+# leading characters of plain scalars YAML may not load as strings
+# (numbers, '=' and '<<' value/merge keys)
+_YAML_NON_STR_LEADING_CHARS = frozenset("0123456789+-.~=<")
+# plain scalars YAML would not load as strings
+_YAML_NON_STR_SCALARS = frozenset(("~", "null", "true", "false", "yes", "no", "on", "off"))
+
+
+def _scan_inline_tags(header: str) -> tuple[bool, list[str] | None]:
+    # fast path for headers without tags or with 'tags: [a, b]', returns
+    # (False, None) if the header has to be loaded as YAML
+    tags_start = header.find("\ntags:")
+    if tags_start == -1:
+        return ("tags" not in header), None
+    if header.find("\ntags:", tags_start + 1) != -1:
+        return False, None
+
+    line_end = header.find("\n", tags_start + 1)
+    line = header[tags_start + 6:line_end if line_end != -1 else len(header)].strip()
+    if len(line) < 2 or line[0] != "[" or line[-1] != "]":
+        return False, None
+    inner = line[1:-1]
+    if not _YAML_FLOW_SPECIAL_CHARS.isdisjoint(inner):
+        return False, None
+    if not inner.strip():
+        return True, []
 
+    tags = [tag.strip() for tag in inner.split(",")]
+    for tag in tags:
+        if not tag or tag[0] in _YAML_NON_STR_LEADING_CHARS or tag.lower() in _YAML_NON_STR_SCALARS:
+            return False, None
+    return True, tags
+
+
+def _fileset_literal(filepath: str) -> str:
+    # jj parses path arguments as filesets, so the path is passed as an exact
+    # file pattern with a quoted string, otherwise spaces, parentheses or
+    # operators like '~' and '|' in note names would be interpreted
+    escaped = filepath.replace('\\', '\\\\').replace('"', '\\"')
+    return f'file:"{escaped}"'
+
+
+def show_file_at_jj_revision(filepath: str, change_id: str) -> bytes:
     cmd_submission = ["jj", "file", "show", "-r",
-                      change_id, f'"{filepath}"', "--ignore-working-copy"]
-    file_content = subprocess.check_output(cmd_submission).decode()
+                      change_id, _fileset_literal(filepath), "--ignore-working-copy"]
+    return subprocess.check_output(cmd_submission)
+
+
+def parse_tags(filepath: str, file_content: bytes) -> list[str] | None:
     try:
-        fm, content = frontmatter.parse(file_content)
-        tags: list[str] | None = fm.get("tags", None)
-        tags = [tag.rstrip("/") for tag in tags] if tags is not None else None
+        tags: list[str] | None = None
+        # only files opening with a YAML header can carry tags
+        if file_content.startswith(b"---"):
+            header_end = file_content.find(b"\n---", 3)
+            if header_end != -1:
+                # the note body is never decoded
+                header = file_content[3:header_end].decode()
+                scanned, tags = _scan_inline_tags(header)
+                if not scanned:
+                    fm = yaml.load(header, Loader=_YAML_LOADER)
+                    tags = fm.get("tags", None) if isinstance(fm, dict) else None
+        # the same few tags repeat across all notes, so they are interned;
+        # rstrip returns the tag itself if it has no trailing slash
+        if tags is not None:
+            tags = [sys.intern(tag.rstrip("/")) for tag in tags]
     except Exception as e:
         print("WARN:", filepath, "could not read tags due to ->", e, file=sys.stderr)
         return None
-
-    tags_at_revision_cache[filepath][change_id] = tags
     return tags
 
 
+# number of changes whose tags are collected together
+_TAGS_WINDOW_SIZE = 256
+
+
+def get_tags_at_jj_revision(filepath: str, change_id: str) -> list[str] | None:
+    if not filepath.endswith(".md"):
+        return None
+    return parse_tags(filepath, show_file_at_jj_revision(filepath, change_id))
+
+
+def collect_tags_for_revisions(
+    requests: list[tuple[str, str]],
+    executor: Executor
+) -> Iterator[tuple[tuple[str, str], list[str] | None]]:
+    # jj cannot frame several files in one `jj file show` output, so the
+    # requested (filepath, change_id) pairs are fetched concurrently instead;
+    # the subprocesses are pure I/O wait, during which the GIL is released.
+    # All fetches are submitted right away, results are yielded in request order
+    return zip(requests, executor.map(lambda request: get_tags_at_jj_revision(*request), requests))
+
+
+def _update_known_paths(
+    change: ChangeDescription,
+    on_drop: Callable[[str], None],
+    on_add: Callable[[FileChange], None]
+):
+    # paths renamed away or deleted by the change are dropped, then all its new
+    # paths are added; shared by requesting and consuming tags, so both agree
+    # on whose old tags are known from an earlier change
+    for file_change in change.file_changes:
+        if file_change.old_path and file_change.old_path != file_change.new_path:
+            on_drop(file_change.old_path)
+    for file_change in change.file_changes:
+        if file_change.new_path:
+            on_add(file_change)
+
+
 def fill_changes_with_tags(
-    changes: list[ChangeDescription],
+    changes: Iterable[ChangeDescription],
     processed_clb: Callable[[ChangeDescription], None] | None = None
 ):
+    # changes arrive oldest first and are consumed in windows, so the tags of
+    # many revisions are collected together without holding the whole history
+    changes = iter(changes)
+
+    # paths whose tags are known from the last change that touched them;
+    # their old tags need not be requested
+    known_paths: set[str] = set()
+    last_known_tags: dict[str, list[str] | None] = dict()
     prev_change_id: str | None = None
-    for change in sorted(changes, key=lambda c: datetime.fromisoformat(c.timestamp)):
-        change_id = change.change_id
-        for file_change in change.file_changes:
-            if file_change.old_path and prev_change_id:
-                file_change.old_tags = get_tags_at_jj_revision(
-                    file_change.old_path, prev_change_id)
-            if file_change.new_path:
-                file_change.new_tags = get_tags_at_jj_revision(
-                    file_change.new_path, change_id)
-            # print(f"Found tags for file '{file_change.new_path}' at rev '{change_id}':", file=sys.stderr)
-            # print(file_change.new_tags, file=sys.stderr)
 
-        if processed_clb is not None:
-            processed_clb(change)
+    # state of the window whose tags are requested next
+    request_prev_change_id: str | None = None
+
+    def request_window_tags(
+        window: list[ChangeDescription]
+    ) -> Iterator[tuple[tuple[str, str], list[str] | None]]:
+        nonlocal request_prev_change_id
+        # collect all tags needed in the window in revision order;
+        # only notes can have tags
+        requests: dict[tuple[str, str], None] = dict()
+        for change in window:
+            for file_change in change.file_changes:
+                old_path = file_change.old_path
+                if old_path and request_prev_change_id and old_path not in known_paths and old_path.endswith(".md"):
+                    requests[(old_path, request_prev_change_id)] = None
+                new_path = file_change.new_path
+                if new_path and new_path.endswith(".md"):
+                    requests[(new_path, change.change_id)] = None
+            _update_known_paths(change, known_paths.discard, lambda file_change: known_paths.add(file_change.new_path))
+            request_prev_change_id = change.change_id
+        return collect_tags_for_revisions(list(requests), executor)
+
+    def take_requested_tags(filepath: str, change_id: str) -> list[str] | None:
+        # non-note paths were never requested and have no tags; a missing note
+        # means both sides disagree on the known paths, which must not pass silently
+        return requested_tags[(filepath, change_id)] if filepath.endswith(".md") else None
+
+    def forget_tags(filepath: str):
+        last_known_tags.pop(filepath, None)
+
+    def remember_tags(file_change: FileChange):
+        last_known_tags[file_change.new_path] = file_change.new_tags
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        window = list(islice(changes, _TAGS_WINDOW_SIZE))
+        window_tags = request_window_tags(window)
+        while window:
+            # tags of the next window are fetched while this one is processed
+            next_window = list(islice(changes, _TAGS_WINDOW_SIZE))
+            next_window_tags = request_window_tags(next_window)
+            requested_tags = dict(window_tags)
+
+            for change in window:
+                change_id = change.change_id
+                for file_change in change.file_changes:
+                    if file_change.old_path and prev_change_id:
+                        if file_change.old_path in last_known_tags:
+                            file_change.old_tags = last_known_tags[file_change.old_path]
+                        else:
+                            file_change.old_tags = take_requested_tags(file_change.old_path, prev_change_id)
+                    if file_change.new_path:
+                        file_change.new_tags = take_requested_tags(file_change.new_path, change_id)
+
+                _update_known_paths(change, forget_tags, remember_tags)
+
+                if processed_clb is not None:
+                    processed_clb(change)
 
-        prev_change_id = change_id
+                prev_change_id = change_id
+
+            window = next_window
+            window_tags = next_window_tags
 
 
 def print_gource_logs_for_change(change: ChangeDescription, path_strategy: PathStrategy):
     paths = path_strategy.get_change_path_set(change)
+    if not paths.new_paths and not paths.old_paths:
+        return
 
-    modified = paths.new_paths.intersection(paths.old_paths)
-    added = paths.new_paths.difference(paths.old_paths)
-    deleted = paths.old_paths.difference(paths.new_paths)
-
-    def make_line(change_type: str, change_path: str) -> str:
-        return f"{change.timestamp}|{change.author}|{change_type}|{change_path}"
+    old_paths = paths.old_paths
+    new_paths = paths.new_paths
 
-    for path in deleted:
-        print(make_line('D', path), flush=True)
-    for path in added:
-        print(make_line('A', path), flush=True)
-    for path in modified:
-        print(make_line('M', path), flush=True)
+    # classify by membership instead of building intermediate sets,
+    # deletions are still emitted first
+    prefix = f"{change.timestamp}|{change.author}|"
+    lines: list[str] = [prefix + "D|" + path for path in old_paths if path not in new_paths]
+    lines.extend(prefix + ("M|" if path in old_paths else "A|") + path for path in new_paths)
 
+    # write the whole change at once, gource only needs complete lines
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
 
-def print_gource_custom_logs(changes: list[ChangeDescription], path_strategy: PathStrategy):
-    for change in changes:
-        print_gource_logs_for_change(change, path_strategy)
 
 def parse_arguments():
     """Parse command line arguments."""
@@ -366,8 +549,7 @@ def main():
     print(f"Using path generation strategy: {args.path_strategy.value}", file=sys.stderr)
 
     raw_changes = get_jj_commits_and_file_path_changes(args.revset, args.ignore_working_copy)
-    print(f"Found {len(raw_changes)} revisions...", file=sys.stderr)
-    
+
     fill_changes_with_tags(raw_changes, processed_clb=lambda c: print_gource_logs_for_change(c, args.path_strategy))
 
 